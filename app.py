@@ -1,21 +1,55 @@
 from __future__ import annotations
 
 import os
+import threading
 import traceback
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, abort, send_file
+from typing import Any
+
+import orjson
+from cachetools import TTLCache
+from flask import Flask, Response, render_template, request, jsonify, abort
+from flask.json.provider import DefaultJSONProvider
+from flask_compress import Compress
 from storage import init_db, save_analysis, list_analyses, get_analysis
-from propertyedge_core import run_propertyedge
+from propertyedge_core import run_propertyedge, parse_property_id
 
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(APP_DIR, "data")
 DB_PATH = os.path.join(DATA_DIR, "propertyedge.db")
 PPD_SQLITE_PATH = os.path.join(DATA_DIR, "ppd.sqlite")  # optional (for sold comps)
 
+ANALYSIS_CACHE_TTL = 1800  # seconds a finished analysis is reused for the same listing
+
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Recent successful /analyze results keyed by Rightmove property id
+_analysis_cache: TTLCache = TTLCache(maxsize=512, ttl=ANALYSIS_CACHE_TTL)
+_analysis_cache_lock = threading.Lock()
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Serve jsonify() responses through orjson, keeping Flask's indent/sort_keys behaviour."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=kwargs.get("default", self.default), option=option).decode()
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.config['DEBUG'] = True
+# Fast gzip level: analysis JSON/markdown compress well even at level 1
+app.config['COMPRESS_MIMETYPES'] = ['application/json', 'text/html', 'text/markdown']
+app.config['COMPRESS_LEVEL'] = 1
+Compress(app)
 init_db(DB_PATH)
 
 
@@ -36,6 +70,18 @@ def analyze():
     if "rightmove.co.uk" not in url.lower():
         return jsonify({"ok": False, "error": "Please provide a valid Rightmove URL."}), 400
 
+    # Reuse a recent analysis of the same listing
+    try:
+        pid = parse_property_id(url)
+    except ValueError:
+        pid = None
+    if pid:
+        with _analysis_cache_lock:
+            cached = _analysis_cache.get(pid)
+        if cached is not None:
+            print(f"[DEBUG] Serving cached analysis for property {pid}")
+            return jsonify({"ok": True, "result": cached, "cached": True})
+
     # Run analysis
     try:
         print(f"[DEBUG] Starting analysis for URL: {url}")
@@ -63,6 +109,10 @@ def analyze():
         result["analysis_id"] = None
         result["permalink"] = None
 
+    if pid:
+        with _analysis_cache_lock:
+            _analysis_cache[pid] = result
+
     return jsonify({"ok": True, "result": result})
 
 
@@ -79,7 +129,12 @@ def analysis_json(analysis_id: int):
     row = get_analysis(DB_PATH, analysis_id)
     if not row:
         abort(404)
-    return jsonify({"ok": True, "analysis": row})
+    # Saved analyses never change, so let browsers/CDNs keep them
+    resp = jsonify({"ok": True, "analysis": row})
+    resp.cache_control.public = True
+    resp.cache_control.max_age = ANALYSIS_CACHE_TTL
+    resp.add_etag()
+    return resp.make_conditional(request)
 
 
 @app.get("/a/<int:analysis_id>/md")
@@ -89,11 +144,12 @@ def analysis_md(analysis_id: int):
         abort(404)
 
     md = row.get("md_report") or ""
-    # Write to a temp file-like response
-    from io import BytesIO
-    buf = BytesIO(md.encode("utf-8"))
     filename = f"propertyedge_{row.get('property_id') or analysis_id}.md"
-    return send_file(buf, as_attachment=True, download_name=filename, mimetype="text/markdown")
+    return Response(
+        md,
+        mimetype="text/markdown",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 if __name__ == "__main__":
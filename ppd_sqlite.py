@@ -1,10 +1,29 @@
 from __future__ import annotations
 
+import functools
+import os
 import re
 import sqlite3
+import threading
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+
+from sqlite_pool import ConnectionPool
+
+_POSTCODE_RE = re.compile(r"^([A-Z]{1,2}\d[A-Z\d]?)\s*(\d[A-Z]{2})$")
+
+# Read-only workload: keep the page cache warm and map the file,
+# but leave the journal mode of the shipped PPD file alone.
+_PPD_PRAGMAS = """
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-20000;
+PRAGMA mmap_size=268435456;
+"""
+
+# path -> (file mtime the pool was opened against, pool)
+_pools: Dict[str, Tuple[float, ConnectionPool]] = {}
+_pools_lock = threading.Lock()
 
 
 @dataclass
@@ -19,7 +38,7 @@ class Comp:
 
 def postcode_sector(pc: str) -> str:
     pc = (pc or "").strip().upper()
-    m = re.match(r"^([A-Z]{1,2}\d[A-Z\d]?)\s*(\d[A-Z]{2})$", pc)
+    m = _POSTCODE_RE.match(pc)
     if not m:
         return pc.split(" ")[0]
     outward = m.group(1)
@@ -32,12 +51,63 @@ def looks_like_flat(property_type: Optional[str]) -> bool:
     return ("flat" in t) or ("apartment" in t)
 
 
+def _pool(ppd_sqlite_path: str) -> ConnectionPool:
+    """Process-wide pool for the PPD file, reopened when the file is replaced."""
+    mtime = os.path.getmtime(ppd_sqlite_path)
+    with _pools_lock:
+        entry = _pools.get(ppd_sqlite_path)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+        pool = ConnectionPool(ppd_sqlite_path, _PPD_PRAGMAS)
+        _pools[ppd_sqlite_path] = (mtime, pool)
+    if entry is not None:
+        # Connections to the old file are closed as they are handed back
+        entry[1].close()
+    return pool
+
+
+def migrate_ppd_db(ppd_sqlite_path: str) -> None:
+    """Precompute postcode_sector and build the covering index for comp lookups.
+
+    Run explicitly after loading or refreshing the PPD file (see __main__);
+    the app never migrates on its own. Re-running only backfills rows that
+    have no sector yet, so sales appended by a later import are picked up.
+    Lookups fall back to a postcode prefix match until this has run.
+    """
+    con = sqlite3.connect(ppd_sqlite_path)
+    try:
+        con.create_function("pe_postcode_sector", 1, postcode_sector, deterministic=True)
+        cols = {r[1] for r in con.execute("PRAGMA table_info(ppd_sales)")}
+        with con:
+            if "postcode_sector" not in cols:
+                con.execute("ALTER TABLE ppd_sales ADD COLUMN postcode_sector TEXT")
+            con.execute(
+                "UPDATE ppd_sales SET postcode_sector = pe_postcode_sector(postcode) WHERE postcode_sector IS NULL"
+            )
+            # Built after the backfill so the UPDATE doesn't maintain it row by row
+            con.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_ppd_sector_date
+                ON ppd_sales(postcode_sector, date, ptype, price, postcode, street, town)
+                """
+            )
+            # Superseded by idx_ppd_sector_date
+            con.execute("DROP INDEX IF EXISTS idx_ppd_pc_date")
+    finally:
+        con.close()
+
+
+@functools.lru_cache(maxsize=32)
+def _has_sector_column(ppd_sqlite_path: str, mtime: float) -> bool:
+    with _pool(ppd_sqlite_path).connection() as con:
+        return any(r[1] == "postcode_sector" for r in con.execute("PRAGMA table_info(ppd_sales)"))
+
+
 def find_comps_sqlite(ppd_sqlite_path: str, postcode: Optional[str], property_type: Optional[str], months: int = 18, limit: int = 12) -> List[Comp]:
     if not postcode:
         return []
 
     sector = postcode_sector(postcode)
-    like = sector + "%"
 
     cutoff = (datetime.utcnow() - timedelta(days=30 * months)).date().isoformat()
 
@@ -45,17 +115,34 @@ def find_comps_sqlite(ppd_sqlite_path: str, postcode: Optional[str], property_ty
     if looks_like_flat(property_type):
         ptype_filter = "F"
 
-    con = sqlite3.connect(ppd_sqlite_path)
-    con.row_factory = sqlite3.Row
-    cur = con.cursor()
-
-    sql = """
+    # The PPD file's mtime is part of the cache key so a refreshed download
+    # invalidates every cached sector automatically.
+    mtime = os.path.getmtime(ppd_sqlite_path)
+    return list(_find_comps_cached(ppd_sqlite_path, sector, ptype_filter, cutoff, limit, mtime))
+
+
+@functools.lru_cache(maxsize=2048)
+def _find_comps_cached(ppd_sqlite_path: str, sector: str, ptype_filter: Optional[str], cutoff: str, limit: int, mtime: float) -> Tuple[Comp, ...]:
+    if not _has_sector_column(ppd_sqlite_path, mtime):
+        # Not migrated yet: prefix match on the raw postcode
+        where = "postcode LIKE ? COLLATE NOCASE"
+        params: List[object] = [sector + "%"]
+    elif " " in sector:
+        # Full postcode: point lookup on the precomputed sector
+        where = "postcode_sector = ?"
+        params = [sector]
+    else:
+        # Outward code only (e.g. "M3"): every sector in that district, i.e. "M3 0".."M3 9"
+        where = "postcode_sector >= ? AND postcode_sector < ?"
+        params = [sector + " ", sector + "!"]
+
+    sql = f"""
       SELECT price, date, postcode, ptype, street, town
       FROM ppd_sales
-      WHERE UPPER(postcode) LIKE ?
+      WHERE {where}
         AND date >= ?
     """
-    params = [like, cutoff]
+    params.append(cutoff)
 
     if ptype_filter:
         sql += " AND ptype = ?"
@@ -64,19 +151,17 @@ def find_comps_sqlite(ppd_sqlite_path: str, postcode: Optional[str], property_ty
     sql += " ORDER BY date DESC LIMIT ?"
     params.append(limit)
 
-    rows = cur.execute(sql, params).fetchall()
-    con.close()
-
-    comps: List[Comp] = []
-    for r in rows:
-        comps.append(
-            Comp(
-                price=int(r["price"]),
-                date=str(r["date"]),
-                postcode=str(r["postcode"]),
-                property_type=str(r["ptype"]),
-                street=r["street"],
-                town=r["town"],
-            )
-        )
-    return comps
+    # Column order matches Comp's fields. price keeps its int(): a table
+    # loaded with `sqlite3 .import` has TEXT columns, and the report formats it with ','.
+    with _pool(ppd_sqlite_path).connection() as con:
+        return tuple(Comp(int(r[0]), *r[1:]) for r in con.execute(sql, params))
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 2:
+        sys.exit("usage: python ppd_sqlite.py <path/to/ppd.sqlite>")
+    print(f"[INFO] Migrating PPD SQLite: {sys.argv[1]}")
+    migrate_ppd_db(sys.argv[1])
+    print("[INFO] Done")
@@ -1,16 +1,83 @@
 from __future__ import annotations
 
+import io
 import json
 import math
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional, Tuple
 
+import diskcache
+import lxml.etree
+import lxml.html
+import numpy as np
+import orjson
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from ppd_sqlite import find_comps_sqlite, Comp
+from propertyedge_helpers import (
+    money_int,
+    pct,
+    round_to_nearest,
+    safe_float,
+    safe_int,
+    sqft_to_sqm,
+)
+
+_PROP_ID_RE = re.compile(r"/properties/(\d+)")
+_PAGE_MODEL_RE = re.compile(r'PAGE_MODEL\s*=\s*(\{.*?\});?\s*(?:window|</script>|$)', re.DOTALL)
+_TITLE_BEDS_RE = re.compile(r'(\d+)\s+bedroom', re.I)
+_TITLE_ADDRESS_RE = re.compile(r'for sale in (.+?)(?:\s*-\s*Rightmove)?$', re.I)
+_PRICE_TEXT_RE = re.compile(r"£\s*([\d,]{5,})")
+
+_PAGE_MODEL_SCRIPTS = '//script[contains(text(), "PAGE_MODEL")]/text()'
+_JSON_LD_SCRIPTS = '//script[@type="application/ld+json"]/text()'
+_PRICE_TAGS = '//*[@data-testid="price"] | //*[contains(concat(" ", normalize-space(@class), " "), " property-header-price ")]'
+_VISIBLE_TEXT = "(//title | //body)//text()[not(ancestor::script) and not(ancestor::style)]"
+
+_loads = orjson.loads
+
+
+def _make_session() -> requests.Session:
+    """Shared keep-alive session so repeat fetches reuse the TCP/TLS connection"""
+    session = requests.Session()
+    session.headers.update({
+        "User-Agent": (
+            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+            "AppleWebKit/537.36 (KHTML, like Gecko) "
+            "Chrome/120.0.0.0 Safari/537.36"
+        ),
+        "Accept-Language": "en-GB,en;q=0.9",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Connection": "keep-alive",
+    })
+    adapter = HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=16,
+        max_retries=Retry(
+            total=2,
+            backoff_factor=0.3,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=("GET",),
+            raise_on_status=False,
+        ),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_SESSION = _make_session()
+
+# Raw listing HTML, reused across re-analyses/debug runs of the same property
+HTML_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "html_cache")
+HTML_CACHE_TTL = 6 * 60 * 60  # seconds; listings change at most daily
+_html_cache = diskcache.Cache(HTML_CACHE_DIR, size_limit=500 * 1024 * 1024)
 
 
 @dataclass
@@ -31,72 +98,23 @@ class ListingFacts:
 
 
 def parse_property_id(url: str) -> str:
-    m = re.search(r"/properties/(\d+)", url)
+    m = _PROP_ID_RE.search(url)
     if not m:
         raise ValueError("Could not find property id in URL.")
     return m.group(1)
 
 
-def money_int(x: Any) -> Optional[int]:
-    if x is None:
-        return None
-    s = str(x)
-    s = re.sub(r"[^\d]", "", s)
-    return int(s) if s else None
-
-
-def sqft_to_sqm(sqft: float) -> float:
-    return sqft * 0.092903
-
-
-def sqm_to_sqft(sqm: float) -> float:
-    return sqm / 0.092903
-
-
-def median(vals: List[float]) -> Optional[float]:
-    if not vals:
-        return None
-    s = sorted(vals)
-    n = len(s)
-    return float(s[n // 2]) if n % 2 else float((s[n // 2 - 1] + s[n // 2]) / 2)
-
-
-def quantile(vals: List[float], q: float) -> Optional[float]:
-    if not vals:
-        return None
-    s = sorted(vals)
-    if len(s) == 1:
-        return float(s[0])
-    pos = (len(s) - 1) * q
-    lo = int(math.floor(pos))
-    hi = int(math.ceil(pos))
-    if lo == hi:
-        return float(s[lo])
-    return float(s[lo] + (s[hi] - s[lo]) * (pos - lo))
-
-
-def pct(a: Optional[float], b: Optional[float]) -> Optional[float]:
-    if a is None or b in (None, 0):
-        return None
-    return (a - b) / b * 100.0
-
-
-def round_to_nearest(x: int, base: int = 1000) -> int:
-    return int(base * round(x / base))
-
-
 def fetch_rightmove_html(url: str, timeout: int = 20) -> str:
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0.0.0 Safari/537.36"
-        ),
-        "Accept-Language": "en-GB,en;q=0.9",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Connection": "keep-alive",
-    }
-    r = requests.get(url, headers=headers, timeout=timeout, allow_redirects=True)
+    try:
+        key = f"rm:{parse_property_id(url)}"
+    except ValueError:
+        key = f"rm:{url}"
+    cached = _html_cache.get(key)
+    if cached:
+        print(f"[DEBUG] Using cached HTML for {key}")
+        return cached
+
+    r = _SESSION.get(url, timeout=timeout, allow_redirects=True)
     r.raise_for_status()
     html = r.text or ""
 
@@ -113,8 +131,7 @@ def fetch_rightmove_html(url: str, timeout: int = 20) -> str:
     if len(html) < 5000 and any(sig.lower() in html.lower() for sig in severe_block_signals):
         title = ""
         try:
-            soup = BeautifulSoup(html, "lxml")
-            title = (soup.title.get_text(strip=True) if soup.title else "")
+            title = page_title(parse_html(html))
         except Exception:
             pass
         raise RuntimeError(
@@ -123,84 +140,65 @@ def fetch_rightmove_html(url: str, timeout: int = 20) -> str:
             "Run the app locally (home IP) or enable Playwright mode."
         )
 
+    # Only real listing pages are cached; block pages raise above
+    _html_cache.set(key, html, expire=HTML_CACHE_TTL)
     return html
 
 
-def find_json_objects(text: str) -> List[Dict[str, Any]]:
-    """Find JSON objects in text"""
+def find_json_objects(text: str, start: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Find JSON objects in text, stopping once `limit` have been decoded"""
     decoder = json.JSONDecoder()
     results = []
-    pos = 0
-    while True:
+    pos = start
+    while limit is None or len(results) < limit:
         match = text.find("{", pos)
         if match == -1:
             break
         try:
-            result, index = decoder.raw_decode(text[match:])
+            result, end = decoder.raw_decode(text, match)
             results.append(result)
-            pos = match + index
+            pos = end
         except ValueError:
             pos = match + 1
     return results
 
 
-def extract_page_model(soup: BeautifulSoup) -> Optional[Dict[str, Any]]:
+def parse_html(html: str) -> lxml.html.HtmlElement:
+    """Parse page HTML into an lxml tree (an empty one for blank/comment-only pages)"""
+    try:
+        return lxml.html.document_fromstring(html or "<html></html>")
+    except lxml.etree.ParserError:
+        return lxml.html.document_fromstring("<html></html>")
+
+
+def page_title(tree: lxml.html.HtmlElement) -> str:
+    return tree.xpath("string(//title)").strip()
+
+
+def extract_page_model(tree: lxml.html.HtmlElement) -> Optional[Dict[str, Any]]:
     """Extract PAGE_MODEL JavaScript variable from Rightmove page"""
-    scripts = soup.find_all("script")
-    for script in scripts:
-        script_text = script.string
-        if script_text and "PAGE_MODEL" in script_text:
+    for script_text in tree.xpath(_PAGE_MODEL_SCRIPTS):
+        if script_text:
             # Find the PAGE_MODEL assignment
-            match = re.search(r'PAGE_MODEL\s*=\s*(\{.*?\});?\s*(?:window|</script>|$)', script_text, re.DOTALL)
+            match = _PAGE_MODEL_RE.search(script_text)
             if match:
                 try:
                     json_str = match.group(1)
-                    data = json.loads(json_str)
+                    data = _loads(json_str)
                     return data
-                except json.JSONDecodeError:
-                    # Try finding JSON objects in the text
-                    json_objects = find_json_objects(script_text)
+                except orjson.JSONDecodeError:
+                    # Decode just the first object from the assignment onwards
+                    # rather than every object in the (often huge) script
+                    json_objects = find_json_objects(script_text, start=match.start(1), limit=1)
                     if json_objects:
                         return json_objects[0]
     return None
 
 
-def deep_get(d: Any, path: List[Any]) -> Any:
-    cur = d
-    for p in path:
-        if cur is None:
-            return None
-        if isinstance(p, int):
-            if isinstance(cur, list) and 0 <= p < len(cur):
-                cur = cur[p]
-            else:
-                return None
-        else:
-            if isinstance(cur, dict):
-                cur = cur.get(p)
-            else:
-                return None
-    return cur
-
-
-def safe_int(x: Any) -> Optional[int]:
-    try:
-        return int(x)
-    except Exception:
-        return None
-
-
-def safe_float(x: Any) -> Optional[float]:
-    try:
-        return float(x)
-    except Exception:
-        return None
-
-
 def parse_listing(url: str) -> ListingFacts:
     pid = parse_property_id(url)
     html = fetch_rightmove_html(url)
-    soup = BeautifulSoup(html, "lxml")
+    tree = parse_html(html)
 
     facts = ListingFacts(url=url, property_id=pid, key_features=[])
 
@@ -215,12 +213,12 @@ def parse_listing(url: str) -> ListingFacts:
         return None
 
     # Try to extract PAGE_MODEL (new Rightmove structure)
-    page_model = extract_page_model(soup)
+    page_model = extract_page_model(tree)
     
     if page_model:
         print(f"[DEBUG] Found PAGE_MODEL data")
         # Extract propertyData from PAGE_MODEL
-        prop_data = deep_get(page_model, ["propertyData"]) or page_model
+        prop_data = page_model.get("propertyData") or page_model
         
         if isinstance(prop_data, dict):
             # Price
@@ -269,19 +267,19 @@ def parse_listing(url: str) -> ListingFacts:
     if not facts.price:
         print(f"[DEBUG] PAGE_MODEL extraction incomplete, trying fallback methods")
         # Try JSON-LD
-        for script in soup.find_all("script", attrs={"type": "application/ld+json"}):
+        for raw in tree.xpath(_JSON_LD_SCRIPTS):
             try:
-                raw = script.get_text(strip=True)
+                raw = raw.strip()
                 if not raw:
                     continue
-                data = json.loads(raw)
+                data = _loads(raw)
                 if isinstance(data, dict):
                     # Use robust price extraction
                     price = get_offer_price(data)
                     if facts.price is None and price is not None:
                         facts.price = money_int(price)
                     
-                    addr = deep_get(data, ["address"])
+                    addr = data.get("address")
                     if isinstance(addr, dict) and facts.address is None:
                         postal = addr.get("postalCode")
                         if postal:
@@ -292,26 +290,29 @@ def parse_listing(url: str) -> ListingFacts:
                             facts.address = ", ".join(bits)
             except Exception:
                 continue
+            # Stop decoding further JSON-LD blocks once they've given us everything they can
+            if facts.price is not None and facts.address is not None:
+                break
         
         # Fallback price from HTML
         if facts.price is None:
-            price_tag = soup.select_one('[data-testid="price"]') or soup.select_one(".property-header-price")
-            if price_tag:
-                facts.price = money_int(price_tag.get_text(" ", strip=True))
+            price_tags = tree.xpath(_PRICE_TAGS)
+            if price_tags:
+                facts.price = money_int(price_tags[0].text_content())
         
         # Last-resort: extract from page title if it contains price info
         if facts.price is None:
             try:
-                title = soup.title.get_text(strip=True) if soup.title else ""
+                title = page_title(tree)
                 # Try to extract bedroom count from title if missing
                 if facts.bedrooms is None:
-                    bed_match = re.search(r'(\d+)\s+bedroom', title, re.I)
+                    bed_match = _TITLE_BEDS_RE.search(title)
                     if bed_match:
                         facts.bedrooms = safe_int(bed_match.group(1))
                 # Try to extract address from title
                 if facts.address is None and "for sale" in title.lower():
                     # Title format: "2 bedroom apartment for sale in Address, Postcode"
-                    addr_match = re.search(r'for sale in (.+?)(?:\s*-\s*Rightmove)?$', title, re.I)
+                    addr_match = _TITLE_ADDRESS_RE.search(title)
                     if addr_match:
                         facts.address = addr_match.group(1).strip()
             except Exception:
@@ -319,7 +320,7 @@ def parse_listing(url: str) -> ListingFacts:
         
         # Last-resort price regex in page text
         if facts.price is None:
-            m = re.search(r"£\s*([\d,]{5,})", soup.get_text(" ", strip=True))
+            m = _PRICE_TEXT_RE.search(" ".join(t.strip() for t in tree.xpath(_VISIBLE_TEXT) if t.strip()))
             if m:
                 facts.price = money_int(m.group(1))
 
@@ -333,15 +334,14 @@ def estimate_value_from_comps(facts: ListingFacts, comps: List[Comp]) -> Tuple[O
         notes.append("No sold comps found (PPD SQLite not loaded or no matches in postcode sector/time window).")
         return None, None, None, notes
 
-    prices = [float(c.price) for c in comps if c.price]
-    mid = median(prices)
-    q25 = quantile(prices, 0.25)
-    q75 = quantile(prices, 0.75)
-
-    if mid is None or q25 is None or q75 is None:
+    prices = np.fromiter((c.price for c in comps if c.price), dtype=np.float64)
+    if prices.size == 0:
         notes.append("Insufficient comp distribution to compute quartiles.")
         return None, None, None, notes
 
+    # One sort for all three cut points (linear interpolation, as before)
+    q25, mid, q75 = (float(v) for v in np.quantile(prices, [0.25, 0.5, 0.75]))
+
     # Light-touch size adjustment if floor area known
     size_adj = 1.0
     if facts.floor_area_sqm:
@@ -418,45 +418,42 @@ def offer_strategy(facts: ListingFacts, fair_low: Optional[int], fair_mid: Optio
 
 
 def render_markdown(facts: ListingFacts, comps: List[Comp], valuation: Dict[str, Any]) -> str:
-    lines = []
-    lines.append(f"# PropertyEdge AI Report — {facts.property_id}")
-    lines.append("")
-    lines.append(f"**Source:** {facts.url}")
-    lines.append("")
-    lines.append("## Fact Card")
-    lines.append(f"- Asking price: {'£{:,.0f}'.format(facts.price) if facts.price else '—'}")
-    lines.append(f"- Address: {facts.address or '—'}")
-    lines.append(f"- Postcode: {facts.postcode or '—'}")
-    lines.append(f"- Type: {facts.property_type or '—'}")
-    lines.append(f"- Tenure: {facts.tenure or '—'}")
-    lines.append(f"- Beds/Baths: {facts.bedrooms or '—'}/{facts.bathrooms or '—'}")
+    buf = io.StringIO()
+    w = buf.write
+    w(f"# PropertyEdge AI Report — {facts.property_id}\n\n")
+    w(f"**Source:** {facts.url}\n\n")
+    w("## Fact Card\n")
+    w(f"- Asking price: {'£{:,.0f}'.format(facts.price) if facts.price else '—'}\n")
+    w(f"- Address: {facts.address or '—'}\n")
+    w(f"- Postcode: {facts.postcode or '—'}\n")
+    w(f"- Type: {facts.property_type or '—'}\n")
+    w(f"- Tenure: {facts.tenure or '—'}\n")
+    w(f"- Beds/Baths: {facts.bedrooms or '—'}/{facts.bathrooms or '—'}\n")
     if facts.floor_area_sqm:
-        lines.append(f"- Size: {facts.floor_area_sqm:.2f} sqm ({int(facts.floor_area_sqft or 0)} sq ft)")
+        w(f"- Size: {facts.floor_area_sqm:.2f} sqm ({int(facts.floor_area_sqft or 0)} sq ft)\n")
     else:
-        lines.append(f"- Size: —")
-    lines.append(f"- EPC: {facts.epc_rating or '—'}")
+        w("- Size: —\n")
+    w(f"- EPC: {facts.epc_rating or '—'}\n")
     if facts.key_features:
-        lines.append(f"- Key features: {', '.join(facts.key_features[:8])}{'…' if len(facts.key_features) > 8 else ''}")
-    lines.append("")
-    lines.append("## Sold comps (Land Registry PPD)")
+        w(f"- Key features: {', '.join(facts.key_features[:8])}{'…' if len(facts.key_features) > 8 else ''}\n")
+    w("\n## Sold comps (Land Registry PPD)\n")
     if not comps:
-        lines.append("- None found.")
+        w("- None found.\n")
     else:
-        lines.append("| Sold date | Sold price | Postcode | Type | Street/Town |")
-        lines.append("|---|---:|---|---|---|")
-        for c in comps:
-            st = " ".join([x for x in [c.street, c.town] if x])
-            lines.append(f"| {c.date} | £{c.price:,} | {c.postcode} | {c.property_type} | {st} |")
-    lines.append("")
-    lines.append("## Valuation")
-    lines.append(f"- Fair value (low/mid/high): {valuation.get('fair_value_range','—')}")
-    lines.append(f"- Asking vs fair-mid: {valuation.get('asking_vs_mid','—')}")
-    lines.append(f"- PropertyEdge score: {valuation.get('score','—')} — {valuation.get('label','—')}")
-    lines.append(f"- Offer anchor: {valuation.get('offer_anchor','—')}")
-    lines.append(f"- Offer band: {valuation.get('offer_band','—')}")
-    lines.append("")
-    lines.append("**Disclaimer:** Educational content only — not a professional valuation or financial advice.")
-    return "\n".join(lines)
+        w("| Sold date | Sold price | Postcode | Type | Street/Town |\n")
+        w("|---|---:|---|---|---|\n")
+        w("".join([
+            f"| {c.date} | £{c.price:,} | {c.postcode} | {c.property_type} | {' '.join([x for x in [c.street, c.town] if x])} |\n"
+            for c in comps
+        ]))
+    w("\n## Valuation\n")
+    w(f"- Fair value (low/mid/high): {valuation.get('fair_value_range','—')}\n")
+    w(f"- Asking vs fair-mid: {valuation.get('asking_vs_mid','—')}\n")
+    w(f"- PropertyEdge score: {valuation.get('score','—')} — {valuation.get('label','—')}\n")
+    w(f"- Offer anchor: {valuation.get('offer_anchor','—')}\n")
+    w(f"- Offer band: {valuation.get('offer_band','—')}\n")
+    w("\n**Disclaimer:** Educational content only — not a professional valuation or financial advice.")
+    return buf.getvalue()
 
 
 def run_propertyedge(url: str, ppd_sqlite_path: Optional[str]) -> Dict[str, Any]:
@@ -506,3 +503,22 @@ def run_propertyedge(url: str, ppd_sqlite_path: Optional[str]) -> Dict[str, Any]
         "valuation": valuation,
         "md_report": md_report,
     }
+
+
+def run_propertyedge_batch(urls: List[str], ppd_sqlite_path: Optional[str], max_workers: int = 16) -> List[Dict[str, Any]]:
+    """Analyse many listings concurrently; results come back in input order.
+
+    Each listing is dominated by its Rightmove fetch, so the analyses are
+    overlapped in a thread pool (sized to match the HTTP connection pool).
+    A failed URL yields {"url": ..., "error": ...} instead of aborting the batch.
+    """
+    def run_one(url: str) -> Dict[str, Any]:
+        try:
+            return run_propertyedge(url, ppd_sqlite_path)
+        except Exception as e:
+            return {"url": url, "error": str(e)}
+
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as pool:
+        return list(pool.map(run_one, urls))
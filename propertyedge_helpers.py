@@ -0,0 +1,70 @@
+"""Scalar helpers on the per-analysis hot path.
+
+Kept free of third-party imports and strictly typed so the module can be
+compiled with mypyc (see setup.py); the pure-Python module is used as-is
+when no compiled build is present.
+"""
+from __future__ import annotations
+
+import re
+from typing import Any, List, Optional
+
+_MONEY_RE = re.compile(r"[^\d]")
+
+
+def money_int(x: Any) -> Optional[int]:
+    if x is None:
+        return None
+    s = str(x)
+    s = _MONEY_RE.sub("", s)
+    return int(s) if s else None
+
+
+def sqft_to_sqm(sqft: float) -> float:
+    return sqft * 0.092903
+
+
+def sqm_to_sqft(sqm: float) -> float:
+    return sqm / 0.092903
+
+
+def pct(a: Optional[float], b: Optional[float]) -> Optional[float]:
+    if a is None or b in (None, 0):
+        return None
+    return (a - b) / b * 100.0
+
+
+def round_to_nearest(x: int, base: int = 1000) -> int:
+    return int(base * round(x / base))
+
+
+def deep_get(d: Any, path: List[Any]) -> Any:
+    cur = d
+    for p in path:
+        if cur is None:
+            return None
+        if isinstance(p, int):
+            if isinstance(cur, list) and 0 <= p < len(cur):
+                cur = cur[p]
+            else:
+                return None
+        else:
+            if isinstance(cur, dict):
+                cur = cur.get(p)
+            else:
+                return None
+    return cur
+
+
+def safe_int(x: Any) -> Optional[int]:
+    try:
+        return int(x)
+    except Exception:
+        return None
+
+
+def safe_float(x: Any) -> Optional[float]:
+    try:
+        return float(x)
+    except Exception:
+        return None
@@ -0,0 +1,21 @@
+"""Optional AOT build of the hot-path helpers.
+
+    pip install mypy
+    python setup.py build_ext --inplace
+
+This drops a compiled propertyedge_helpers extension next to the .py file,
+which Python then imports in preference to it. Without the build step the
+app runs on the pure-Python module unchanged.
+
+The built .so is git-ignored and shadows the source: after editing
+propertyedge_helpers.py, re-run the build (or delete the .so), otherwise
+the old compiled code keeps running.
+"""
+from setuptools import setup
+from mypyc.build import mypycify
+
+setup(
+    name="propertyedge-helpers",
+    py_modules=[],
+    ext_modules=mypycify(["propertyedge_helpers.py"], opt_level="3"),
+)
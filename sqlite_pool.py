@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional
+
+
+class ConnectionPool:
+    """Process-wide pool of SQLite connections to one database file.
+
+    Requests borrow a connection and hand it back when done, so setup cost
+    (open, schema parse, PRAGMAs) is paid once per pooled connection rather
+    than once per request/thread/greenlet. Connections are opened with
+    check_same_thread=False because they move between request threads.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        pragmas: str = "",
+        row_factory: Optional[Callable[..., Any]] = None,
+        max_idle: int = 8,
+    ) -> None:
+        self.path = path
+        self.pragmas = pragmas
+        self.row_factory = row_factory
+        self.max_idle = max_idle
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _open(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.path, check_same_thread=False)
+        if self.row_factory is not None:
+            con.row_factory = self.row_factory
+        if self.pragmas:
+            con.executescript(self.pragmas)
+        return con
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            con = self._idle.pop() if self._idle else None
+        if con is None:
+            con = self._open()
+        try:
+            yield con
+        finally:
+            keep = False
+            with self._lock:
+                if not self._closed and not con.in_transaction and len(self._idle) < self.max_idle:
+                    self._idle.append(con)
+                    keep = True
+            if not keep:
+                con.close()
+
+    def close(self) -> None:
+        """Close idle connections; borrowed ones are closed when handed back."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for con in idle:
+            con.close()
@@ -1,120 +1,134 @@
 from __future__ import annotations
 
-import json
 import sqlite3
-from typing import Any, Dict, List, Optional
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+
+from sqlite_pool import ConnectionPool
+
+_loads = orjson.loads
+
+
+def _dumps(obj: Any) -> str:
+    return orjson.dumps(obj).decode()
+
+
+_STORAGE_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-20000;
+"""
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool(db_path: str) -> ConnectionPool:
+    """The process-wide connection pool for db_path, created on first use."""
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = _pools[db_path] = ConnectionPool(db_path, _STORAGE_PRAGMAS, row_factory=sqlite3.Row)
+        return pool
 
 
 def init_db(db_path: str) -> None:
-    con = sqlite3.connect(db_path)
-    cur = con.cursor()
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS analyses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            created_at_utc TEXT NOT NULL,
-            url TEXT NOT NULL,
-            property_id TEXT,
-            facts_json TEXT,
-            comps_json TEXT,
-            valuation_json TEXT,
-            md_report TEXT
+    with _pool(db_path).connection() as con, con:
+        con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS analyses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at_utc TEXT NOT NULL,
+                url TEXT NOT NULL,
+                property_id TEXT,
+                facts_json TEXT,
+                comps_json TEXT,
+                valuation_json TEXT,
+                md_report TEXT
+            )
+            """
         )
-        """
-    )
-    con.commit()
-    con.close()
 
 
-def save_analysis(db_path: str, result: Dict[str, Any]) -> int:
-    con = sqlite3.connect(db_path)
-    cur = con.cursor()
-
+def _analysis_row(result: Dict[str, Any]) -> Tuple[Any, ...]:
     facts = result.get("facts") or {}
     valuation = result.get("valuation") or {}
     comps = result.get("comps") or []
-
-    cur.execute(
-        """
-        INSERT INTO analyses (created_at_utc, url, property_id, facts_json, comps_json, valuation_json, md_report)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            result.get("created_at_utc"),
-            facts.get("url"),
-            facts.get("property_id"),
-            json.dumps(facts),
-            json.dumps(comps),
-            json.dumps(valuation),
-            result.get("md_report") or "",
-        ),
+    return (
+        result.get("created_at_utc"),
+        facts.get("url"),
+        facts.get("property_id"),
+        _dumps(facts),
+        _dumps(comps),
+        _dumps(valuation),
+        result.get("md_report") or "",
     )
 
-    con.commit()
-    new_id = cur.lastrowid
-    con.close()
-    return int(new_id)
 
+def save_analyses_bulk(db_path: str, results: List[Dict[str, Any]]) -> List[int]:
+    """Insert many analyses in one transaction; returns their new ids in order."""
+    if not results:
+        return []
+    rows = [_analysis_row(r) for r in results]
 
-def list_analyses(db_path: str, limit: int = 30) -> List[Dict[str, Any]]:
-    con = sqlite3.connect(db_path)
-    con.row_factory = sqlite3.Row
-    cur = con.cursor()
-
-    rows = cur.execute(
-        """
-        SELECT id, created_at_utc, url, property_id, valuation_json
-        FROM analyses
-        ORDER BY id DESC
-        LIMIT ?
-        """,
-        (limit,),
-    ).fetchall()
-
-    out: List[Dict[str, Any]] = []
-    for r in rows:
-        valuation = {}
-        try:
-            valuation = json.loads(r["valuation_json"] or "{}")
-        except Exception:
-            pass
-        out.append(
-            {
-                "id": r["id"],
-                "created_at_utc": r["created_at_utc"],
-                "url": r["url"],
-                "property_id": r["property_id"],
-                "score": valuation.get("score"),
-                "label": valuation.get("label"),
-                "fair_value_mid": valuation.get("fair_value_mid"),
-            }
+    with _pool(db_path).connection() as con, con:
+        con.executemany(
+            """
+            INSERT INTO analyses (created_at_utc, url, property_id, facts_json, comps_json, valuation_json, md_report)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
         )
+        # The write transaction excludes other writers, so the ids are consecutive
+        last_id = con.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+    first_id = int(last_id) - len(rows) + 1
+    return list(range(first_id, first_id + len(rows)))
 
-    con.close()
-    return out
+
+def save_analysis(db_path: str, result: Dict[str, Any]) -> int:
+    return save_analyses_bulk(db_path, [result])[0]
+
+
+def list_analyses(db_path: str, limit: int = 30) -> List[Dict[str, Any]]:
+    # JSON1 pulls the three dashboard fields out in C; malformed rows give NULLs
+    with _pool(db_path).connection() as con:
+        rows = con.execute(
+            """
+            SELECT id, created_at_utc, url, property_id,
+                   CASE WHEN json_valid(valuation_json) THEN json_extract(valuation_json, '$.score') END AS score,
+                   CASE WHEN json_valid(valuation_json) THEN json_extract(valuation_json, '$.label') END AS label,
+                   CASE WHEN json_valid(valuation_json) THEN json_extract(valuation_json, '$.fair_value_mid') END AS fair_value_mid
+            FROM analyses
+            ORDER BY id DESC
+            LIMIT ?
+            """,
+            (limit,),
+        ).fetchall()
+
+    return [dict(r) for r in rows]
 
 
 def get_analysis(db_path: str, analysis_id: int) -> Optional[Dict[str, Any]]:
-    con = sqlite3.connect(db_path)
-    con.row_factory = sqlite3.Row
-    cur = con.cursor()
-
-    r = cur.execute(
-        """
-        SELECT *
-        FROM analyses
-        WHERE id = ?
-        """,
-        (analysis_id,),
-    ).fetchone()
-
-    con.close()
+    with _pool(db_path).connection() as con:
+        r = con.execute(
+            """
+            SELECT *
+            FROM analyses
+            WHERE id = ?
+            """,
+            (analysis_id,),
+        ).fetchone()
+
     if not r:
         return None
 
-    facts = json.loads(r["facts_json"] or "{}")
-    comps = json.loads(r["comps_json"] or "[]")
-    valuation = json.loads(r["valuation_json"] or "{}")
+    facts = _loads(r["facts_json"] or "{}")
+    comps = _loads(r["comps_json"] or "[]")
+    valuation = _loads(r["valuation_json"] or "{}")
 
     return {
         "id": r["id"],
@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+from gevent import monkey
+
+# Patch sockets/ssl before anything imports requests, so the outbound
+# Rightmove fetch in /analyze yields to other greenlets instead of blocking
+# the worker.
+monkey.patch_all()
+
+from app import app  # noqa: E402
+
+# gunicorn -k gevent -w 9 --worker-connections 1000 -b 0.0.0.0:5050 wsgi:app